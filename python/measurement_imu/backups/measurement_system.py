@@ -9,14 +9,14 @@ LSM6DS3TR加速度センサーによる振動測定システム - シンプル
 @author keigo ushiyama (Pythonバージョン)
 @date 2023/12/26
 """
+import os
 import sys
+import math
 import time
 import csv
-import struct
 import threading
 from pathlib import Path
 from datetime import datetime
-from collections import deque
 from typing import List, Tuple, Optional
 
 import numpy as np
@@ -24,6 +24,11 @@ import serial
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
+try:
+    from numba import njit
+except ImportError:  # numba未導入ならNumPy実装で動作
+    njit = None
+
 
 # ============================================================
 # 設定
@@ -33,6 +38,7 @@ class Config:
     # シリアル通信
     COM_PORT = "COM7"
     BAUD_RATE = 921600
+    READ_BATCH_FRAMES = 64  # 1回の読み込みでまとめて処理する最大パケット数
     
     # センサー設定
     FULL_SCALE_IN_G = 16.0  # [g]
@@ -59,48 +65,68 @@ class Config:
 
 
 # ============================================================
-# 加速度データクラス
+# 生データ変換
 # ============================================================
-class Accel:
-    """加速度データ"""
-    
-    def __init__(self, raw_x: int = None, raw_y: int = None, raw_z: int = None,
-                 ax: float = None, ay: float = None, az: float = None):
-        if raw_x is not None:
-            self.ax = self._convert(raw_x)
-            self.ay = self._convert(raw_y)
-            self.az = self._convert(raw_z)
-        else:
-            self.ax = ax or 0.0
-            self.ay = ay or 0.0
-            self.az = az or 0.0
-    
-    @staticmethod
-    def _convert(raw_value: int) -> float:
-        """生データをm/s²に変換"""
-        if raw_value > 32767:
-            raw_value -= 65536
-        g_value = raw_value * (2.0 * Config.FULL_SCALE_IN_G) / Config.ADC_RESOLUTION
-        return g_value * Config.GRAVITY_MS2
-    
-    def __repr__(self):
-        return f"Accel({self.ax:.3f}, {self.ay:.3f}, {self.az:.3f})"
-
-
-def calc_average_accel(accel_list: List[Accel]) -> Accel:
-    """平均加速度を計算（重力除去用）"""
-    if not accel_list:
-        return Accel(ax=0, ay=0, az=0)
-    sum_x = sum(a.ax for a in accel_list)
-    sum_y = sum(a.ay for a in accel_list)
-    sum_z = sum(a.az for a in accel_list)
-    n = len(accel_list)
-    return Accel(ax=sum_x/n, ay=sum_y/n, az=sum_z/n)
+# 生データ(符号付き16bit) → m/s² の変換係数
+_ACCEL_SCALE = np.float32(2.0 * Config.FULL_SCALE_IN_G * Config.GRAVITY_MS2
+                          / Config.ADC_RESOLUTION)
 
 
 # ============================================================
 # 直交検波（振動検出）
 # ============================================================
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _qd_kernel(az, SS, CC, inv_n):
+        """sin/cos内積と振幅・位相計算を1ループで行う"""
+        s = 0.0
+        c = 0.0
+        for i in range(az.shape[0]):
+            v = az[i]
+            s += SS[i] * v
+            c += CC[i] * v
+        return math.hypot(s, c) * 2.0 * inv_n, math.atan2(c, s)
+
+    @njit(cache=True, fastmath=True)
+    def _abs_max(a):
+        """|a| の最大値を1パスで求める"""
+        m = 0.0
+        for i in range(a.shape[0]):
+            v = abs(a[i])
+            if v > m:
+                m = v
+        return m
+else:
+    _qd_kernel = None
+
+    def _abs_max(a):
+        """|a| の最大値（np.abs の一時配列を作らない）"""
+        return max(-float(a.min()), float(a.max()))
+
+
+# これ以下の DATA_LEN なら基底を定数として埋め込んだ展開済みカーネルを生成する
+_UNROLL_MAX_LEN = 256
+
+
+def _build_unrolled_kernel(SS: np.ndarray, CC: np.ndarray):
+    """
+    DATA_LEN と sin/cos 基底をリテラルとして埋め込んだ直交検波カーネルを生成
+    
+    ループ長と係数がコンパイル時定数になるので、LLVM が完全展開・SIMD化できる。
+    exec で生成した関数はソースファイルを持たないため cache=True は使えない。
+    """
+    n = len(SS)
+    lines = ["def _kernel(az):", "    s = 0.0", "    c = 0.0"]
+    for i in range(n):
+        lines.append(f"    v = az[{i}]")
+        lines.append(f"    s += {float(SS[i])!r} * v")
+        lines.append(f"    c += {float(CC[i])!r} * v")
+    lines.append(f"    return math.hypot(s, c) * {2.0 / n!r}, math.atan2(c, s)")
+    namespace = {'math': math}
+    exec("\n".join(lines), namespace)
+    return njit(fastmath=True)(namespace['_kernel'])
+
+
 class VibrationDetector:
     """直交検波による振動検出"""
     
@@ -115,22 +141,38 @@ class VibrationDetector:
         w = 2 * np.pi * Config.VIBRATION_FREQ
         self.SS = np.sin(w * t)
         self.CC = np.cos(w * t)
-    
-    def detect(self, accel_list: List[Accel]) -> Tuple[float, float]:
-        """振幅と位相を検出"""
-        if len(accel_list) < Config.DATA_LEN:
+        # JITカーネル用に sin/cos を連続な float32 の (2, DATA_LEN) にまとめておく
+        self.basis = np.ascontiguousarray(np.stack([self.SS, self.CC]), dtype=np.float32)
+        # NumPy版では exp(-jωt) との複素内積1回で sin/cos 両成分を得る
+        # （実部 = Σaz·cos, 虚部 = -Σaz·sin）
+        self._basis_c = np.exp(-1j * w * t).astype(np.complex64)
+        self._scale = 2.0 / Config.DATA_LEN
+        
+        # numba 使用時の検波関数 az -> (amplitude, phase)
+        self._kernel = None
+        if njit is not None:
+            if Config.DATA_LEN <= _UNROLL_MAX_LEN:
+                self._kernel = _build_unrolled_kernel(self.SS, self.CC)
+            else:
+                ss, cc, inv_n = self.basis[0], self.basis[1], 1.0 / Config.DATA_LEN
+                self._kernel = lambda az: _qd_kernel(az, ss, cc, inv_n)
+            # 初回呼び出しのJITコンパイルをここで済ませておく
+            self._kernel(np.zeros(Config.DATA_LEN, dtype=np.float32))
+    
+    def detect(self, az: np.ndarray) -> Tuple[float, float]:
+        """振幅と位相を検出（az: float32配列）"""
+        if len(az) < Config.DATA_LEN:
             return 0.0, 0.0
         
-        # Z軸データを抽出
-        az = np.array([a.az for a in accel_list[:Config.DATA_LEN]])
+        if self._kernel is not None:
+            return self._kernel(az[:Config.DATA_LEN])
         
         # 畳み込み
-        ss_sum = np.sum(self.SS * az)
-        cc_sum = np.sum(self.CC * az)
+        r = complex(self._basis_c @ az[:Config.DATA_LEN].astype(np.complex64))
         
         # 振幅と位相
-        amplitude = np.sqrt(ss_sum**2 + cc_sum**2) * 2.0 / Config.DATA_LEN
-        phase = np.arctan2(cc_sum, ss_sum)
+        amplitude = abs(r) * self._scale
+        phase = math.atan2(r.real, -r.imag)
         
         return amplitude, phase
 
@@ -139,44 +181,110 @@ class VibrationDetector:
 # データ収集・管理
 # ============================================================
 class DataManager:
-    """データ収集と管理"""
+    """
+    データ収集と管理（SoAリングバッファ）
+    
+    書き込みはシリアルスレッド、読み出しはUIスレッドのみ（SPSC）なので
+    リングバッファ自体にはロックを使わない。書き込み側はスロットを書いてから
+    累積書き込み数 widx を更新し、読み出し側は先に widx を読んでから
+    直近 DATA_LEN 個を取り出す。
+    """
     
     def __init__(self):
-        self.accel_lists = [deque(maxlen=Config.DATA_LEN) 
-                           for _ in range(Config.SENSOR_NUM)]
-        self.measurement_list = []
-        self.timestamps = []
+        # [センサー, 軸(x/y/z), サンプル] のリングバッファ
+        # （未書き込みのスロットは読まないので初期化不要）
+        self.buf = np.empty((Config.SENSOR_NUM, 3, Config.DATA_LEN), dtype=np.float32)
+        self.widx = 0  # 累積書き込み数（全センサー共通、シリアルスレッドのみが更新）
+        # 書き込みを始めた時点で先に進める widx（widx と違えば書き込み中、読み出し側の上書き検出用）
+        self._wbegin = 0
+        self._clear_idx = 0  # clear_all() 時点の widx
+        self.measurement_list = []  # 記録中のバッチ shape=(k, 3) のリスト
+        self.timestamps = []  # 記録中のバッチ shape=(k,) のリスト [µs]
         self.max_amps = [0.0] * Config.SENSOR_NUM
         self.calc_amps = [0.0] * Config.SENSOR_NUM
         self.is_recording = False
-        self._lock = threading.Lock()
-    
-    def add_data(self, sensor_id: int, accel: Accel):
-        """データを追加"""
-        with self._lock:
-            self.accel_lists[sensor_id].append(accel)
-            if self.is_recording:
-                self.measurement_list.append(accel)
-                self.timestamps.append(int(time.time_ns() / 1000))
+        self._rec_lock = threading.Lock()  # 記録用リストの保護（リングバッファには使わない）
+        self._sample_dt_us = 1e6 / Config.SAMPLING_RATE
     
-    def get_data(self, sensor_id: int) -> List[Accel]:
-        """データを取得"""
-        with self._lock:
-            return list(self.accel_lists[sensor_id])
+    def add_batch(self, accel: np.ndarray):
+        """
+        複数パケット分の全センサーデータを一括追加
+        
+        Args:
+            accel: shape=(nframes, SENSOR_NUM, 3) の加速度 [m/s²]
+        """
+        nframes = accel.shape[0]
+        w = self.widx
+        self._wbegin = w + nframes  # スロットを書き換える前に書き込み開始を知らせる
+        # リングに収まらない古いフレームは書かない
+        data = accel[-Config.DATA_LEN:].transpose(1, 2, 0)  # (SENSOR_NUM, 3, k)
+        k = data.shape[2]
+        i = (w + nframes - k) % Config.DATA_LEN
+        first = min(k, Config.DATA_LEN - i)
+        np.copyto(self.buf[:, :, i:i + first], data[:, :, :first])
+        if first < k:
+            np.copyto(self.buf[:, :, :k - first], data[:, :, first:])
+        self.widx = w + nframes  # スロットを書き終えてから公開する
+        if self.is_recording:
+            # 時刻取得はバッチごとに1回。各パケットの時刻はサンプリング周期から逆算する [µs]
+            t_last = time.monotonic_ns() // 1000
+            frame_ts = t_last - (np.arange(nframes - 1, -1, -1) * self._sample_dt_us).astype(np.int64)
+            ts = np.repeat(frame_ts, Config.SENSOR_NUM)
+            # 開始・停止と競合しても2つのリストの長さがずれないよう、判定と追加をまとめてロックする
+            with self._rec_lock:
+                if self.is_recording:
+                    self.measurement_list.append(accel.reshape(-1, 3))
+                    self.timestamps.append(ts)
+    
+    def get_contig(self, sensor_id: int, out: np.ndarray) -> np.ndarray:
+        """
+        古い順に並べたデータを out にコピーして取得
+        
+        書き込み側はロックなしでリングを更新し続けるので、
+        呼び出し側はこのコピー（スナップショット）だけを使うこと
+        コピー中に書き込みが始まったら（古いスロットが上書きされうるので）コピーし直す
+        
+        Args:
+            out: shape=(3, DATA_LEN) の float32 作業領域
+        Returns:
+            out[:, :n] のビュー shape=(3, n)
+        """
+        while True:
+            w = self.widx
+            n = min(w - self._clear_idx, Config.DATA_LEN)
+            i = (w - n) % Config.DATA_LEN
+            first = min(n, Config.DATA_LEN - i)
+            np.copyto(out[:, :first], self.buf[sensor_id, :, i:i + first])
+            if first < n:
+                np.copyto(out[:, first:n], self.buf[sensor_id, :, :n - first])
+            if self._wbegin == w:
+                return out[:, :n]
+            time.sleep(0)  # 書き込み中なのでシリアルスレッドに GIL を譲ってからやり直す
     
     def start_recording(self):
         """記録開始"""
-        with self._lock:
+        with self._rec_lock:
             self.measurement_list.clear()
             self.timestamps.clear()
             self.is_recording = True
         print("Recording started")
     
-    def stop_recording(self) -> Tuple[List[Accel], List[int]]:
-        """記録停止"""
-        with self._lock:
+    def stop_recording(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        記録停止
+        
+        Returns:
+            shape=(N, 3) の加速度 float32 配列と shape=(N,) のタイムスタンプ int64 配列
+        """
+        with self._rec_lock:
             self.is_recording = False
-            return self.measurement_list.copy(), self.timestamps.copy()
+            if not self.measurement_list:
+                return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.int64)
+            return np.concatenate(self.measurement_list), np.concatenate(self.timestamps)
+    
+    def clear_all(self):
+        """リングバッファをクリア（widx は書き込み側専用なので基準位置だけ進める）"""
+        self._clear_idx = self.widx
 
 
 # ============================================================
@@ -190,6 +298,7 @@ class SerialComm:
         self.port = None
         self.is_running = False
         self.thread = None
+        self._fd = None
         
         try:
             self.port = serial.Serial(Config.COM_PORT, Config.BAUD_RATE, timeout=1)
@@ -197,6 +306,19 @@ class SerialComm:
             time.sleep(2)
         except Exception as e:
             print(f"Serial error: {e}")
+            return
+        
+        # 受信バッファを広げる（Windowsのみ対応）
+        try:
+            self.port.set_buffer_size(rx_size=1 << 20)
+        except AttributeError:
+            pass
+        
+        # POSIXなら fd から直接読む（Windowsの pyserial は fileno() 非対応）
+        try:
+            self._fd = self.port.fileno()
+        except (AttributeError, OSError):
+            pass
     
     def start(self):
         """通信開始"""
@@ -220,26 +342,47 @@ class SerialComm:
             pass
         print("Serial stopped")
     
+    def _read_chunk(self, size: int) -> bytes:
+        """最大 size バイト読む（POSIXでは pyserial を介さず fd から直接読む）"""
+        if self._fd is not None:
+            return os.read(self._fd, size)
+        return self.port.read(size)
+    
     def _read_loop(self):
-        """データ読み取りループ"""
+        """
+        データ読み取りループ
+        
+        受信済みのバイトを1回の読み込みでまとめて取り出し（最大 READ_BATCH_FRAMES
+        パケット分）、変換からリングバッファへの格納までを NumPy の一括処理で行う
+        （サンプル単位の Python 処理は持たない）。DataManager のリングは SPSC なので
+        ロック不要。
+        """
         bytes_expected = Config.SENSOR_NUM * 6
+        max_chunk = Config.READ_BATCH_FRAMES * bytes_expected
+        rx = bytearray()  # パケット境界に満たない端数を溜めておく
         while self.is_running:
             try:
-                if self.port.in_waiting >= bytes_expected:
-                    buffer = self.port.read(bytes_expected)
-                    self._parse_data(buffer)
+                avail = self.port.in_waiting
+                if avail:
+                    rx += self._read_chunk(min(avail, max_chunk))
+                else:
+                    # 何も来ていなければ1パケット分をタイムアウト付きで待つ
+                    rx += self.port.read(bytes_expected)
+                usable = len(rx) - len(rx) % bytes_expected
+                if usable:
+                    self._parse_data(rx[:usable])
+                    del rx[:usable]
             except Exception as e:
                 print(f"Read error: {e}")
                 break
     
     def _parse_data(self, buffer: bytes):
-        """データ解析"""
-        for sensor_id in range(Config.SENSOR_NUM):
-            offset = sensor_id * 6
-            raw = [struct.unpack('>h', buffer[offset+i*2:offset+i*2+2])[0] 
-                   for i in range(3)]
-            accel = Accel(raw_x=raw[0], raw_y=raw[1], raw_z=raw[2])
-            self.data_manager.add_data(sensor_id, accel)
+        """データ解析（符号付き16bit big-endianを複数パケット分一括変換）"""
+        nframes = len(buffer) // (Config.SENSOR_NUM * 6)
+        raw = np.frombuffer(buffer, dtype='>i2', count=nframes * Config.SENSOR_NUM * 3)
+        accel = raw.reshape(nframes, Config.SENSOR_NUM, 3).astype(np.float32)
+        accel *= _ACCEL_SCALE
+        self.data_manager.add_batch(accel)
     
     def dispose(self):
         """クリーンアップ"""
@@ -265,6 +408,8 @@ class Visualizer:
         self.frame_count = 0
         self.last_time = time.time()
         self.fps_text = None
+        self._last_widx = -1  # 最後に描画した時点の DataManager.widx
+        self._artists = []  # 最後に返した（blit 対象の）アーティスト
     
     def setup(self):
         """プロット初期化"""
@@ -273,6 +418,13 @@ class Visualizer:
         # FPS計測用
         self.frame_count = 0
         self.last_time = time.time()
+        
+        # x軸は固定長なので使い回し、y は重力除去結果を書き込む作業領域を使う
+        # （データが DATA_LEN に満たない部分は NaN にして描画しない）
+        self._x = np.arange(Config.DATA_LEN)
+        self._scratch = np.full((Config.SENSOR_NUM, 3, Config.DATA_LEN), np.nan,
+                                dtype=np.float32)
+        _abs_max(np.zeros(1, dtype=np.float32))  # JITコンパイルを先に済ませる
 
         for i in range(Config.MAX_SENSOR_NUM):
             # r = (i % 2) + 1
@@ -311,8 +463,32 @@ class Visualizer:
                                                alpha=0.7))
 
         self.fig.tight_layout()
+        
+        # 描画幅[px]に対してサンプル数が多すぎる場合は min/max 包絡で間引く
+        width = int(self.axes[0].bbox.width)
+        self._ds = max(1, Config.DATA_LEN // (2 * max(width, 1)))
+        self._nbins = Config.DATA_LEN // (2 * self._ds)
+        x_plot = self._x if self._ds == 1 else np.arange(2 * self._nbins) * self._ds
+        for i in range(Config.SENSOR_NUM):
+            for axis, key in enumerate(('x', 'y', 'z')):
+                self.lines[i][key].set_data(x_plot, self._decimate(self._scratch[i, axis]))
+        
+        # アクティブなセンサーのラインとテキストを blit 対象にする
+        # （書き込みが進んでいないフレームでも同じリストを返し、全体再描画を起こさない）
+        self._artists = [a for i in range(Config.SENSOR_NUM)
+                         for a in (*self.lines[i].values(), self.texts[i])]
         return self.fig
     
+    def _decimate(self, y: np.ndarray) -> np.ndarray:
+        """2*_ds サンプルごとの min/max を交互に並べて間引く（_ds == 1 ならそのまま）"""
+        if self._ds == 1:
+            return y
+        blocks = y[:self._nbins * 2 * self._ds].reshape(self._nbins, 2 * self._ds)
+        out = np.empty(2 * self._nbins, dtype=y.dtype)
+        out[0::2] = blocks.min(axis=1)
+        out[1::2] = blocks.max(axis=1)
+        return out
+    
     def update(self, frame):
         """表示更新"""
 
@@ -328,62 +504,63 @@ class Visualizer:
             self.last_time = current_time
             print(fps)
 
+        # 前回描画から書き込みが進んでいなければデータは更新せず、前回のアーティストを返す
+        # （空リストを返すと FuncAnimation が図全体を再描画してしまう）
+        # （全センサーは add_batch で同時に進むので widx は共通）
+        w = self.data_manager.widx
+        if w == self._last_widx:
+            return self._artists
+        self._last_widx = w
+        
+        # when blit=True, we need to return updated "artist" objects
+        # 更新したセンサーのラインとテキストだけを返す
+        updated_artists = []
+        
         # 更新処理
         for sid in range(Config.SENSOR_NUM):
-            data = self.data_manager.get_data(sid)
-            if not data:
+            # 作業領域へコピーしたスナップショットで検波・重力除去を行う
+            out = self._scratch[sid]
+            arr = self.data_manager.get_contig(sid, out)  # shape=(3, n) float32
+            n = arr.shape[1]
+            if n == 0:
                 continue
             
-            # 重力除去
-            avg = calc_average_accel(data)
-            n = len(data)
-            x_idx = np.arange(n)
-            x_data = np.array([a.ax - avg.ax for a in data])
-            y_data = np.array([a.ay - avg.ay for a in data])
-            z_data = np.array([a.az - avg.az for a in data])
+            # 直交検波（重力除去前のZ軸で行う）
+            if n >= Config.DATA_LEN:
+                calc_amp, _ = self.detector.detect(arr[2])
+                self.data_manager.calc_amps[sid] = calc_amp
+            else:
+                calc_amp = 0
             
-            # ライン更新
-            self.lines[sid]['x'].set_data(x_idx, x_data)
-            self.lines[sid]['y'].set_data(x_idx, y_data)
-            self.lines[sid]['z'].set_data(x_idx, z_data)
+            # 重力除去（作業領域の先頭 n サンプルをその場で書き換える）
+            np.subtract(arr, arr.mean(axis=1, keepdims=True), out=arr)
+            if n < Config.DATA_LEN:
+                out[:, n:] = np.nan
+            z_data = out[2, :n]
             
-            # Y軸調整
-            # all_data = np.concatenate([x_data, y_data, z_data])
-            # if len(all_data) > 0:
-            #     y_min, y_max = all_data.min(), all_data.max()
-            #     margin = (y_max - y_min) * 0.1 if y_max != y_min else 1
-            #     self.axes[sid].set_ylim(y_min - margin, y_max + margin)
+            # ライン更新（x は固定なので y のみ）
+            self.lines[sid]['x'].set_ydata(self._decimate(out[0]))
+            self.lines[sid]['y'].set_ydata(self._decimate(out[1]))
+            self.lines[sid]['z'].set_ydata(self._decimate(out[2]))
             
             # 振幅計算
             # print(z_data)
-            max_amp = np.max(np.abs(z_data)) if len(z_data) > 0 else 0
+            max_amp = _abs_max(z_data)
             # print(max_amp)
             self.data_manager.max_amps[sid] = max_amp
             
-            if len(data) >= Config.DATA_LEN:
-                calc_amp, _ = self.detector.detect(data)
-                self.data_manager.calc_amps[sid] = calc_amp
-            else:
-                calc_amp = 0
-            
             # テキスト更新
             self.texts[sid].set_text(
                 f"Calc: {calc_amp:.3f} m/s²\nMeans: {max_amp:.3f} m/s²"
             )
+            
+            updated_artists.extend(self.lines[sid].values())
+            updated_artists.append(self.texts[sid])
+        # updated_artists.append(self.fps_text)
         
-        # when blit=True, we need to return updated "artist" objects
-        # ラインとテキストの両方を返す
-        all_artists = []
-        
-        # すべてのラインを追加
-        for lines_dict in self.lines.values():
-            all_artists.extend(lines_dict.values())
-        
-        # すべてのテキストを追加
-        all_artists.extend(self.texts.values())
-        # all_artists.append(self.fps_text)
-        
-        return all_artists
+        if updated_artists:
+            self._artists = updated_artists
+        return self._artists
     
     def start(self):
         """アニメーション開始"""
@@ -403,24 +580,37 @@ class FileWriter:
         self.base_name = base_name
         (Config.DATA_DIR / base_name).mkdir(parents=True, exist_ok=True)
     
-    def _create_filename(self, suffix: str) -> Path:
+    def _create_filename(self, suffix: str, ext: str = "csv") -> Path:
         """ファイル名生成"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return Config.DATA_DIR / self.base_name / f"{self.base_name}-{suffix}-{timestamp}.csv"
+        return Config.DATA_DIR / self.base_name / f"{self.base_name}-{suffix}-{timestamp}.{ext}"
     
-    def save_measurement(self, accel_list: List[Accel], timestamps: List[int]):
-        """測定データ保存"""
-        if not accel_list:
+    def save_measurement(self, accel_data: np.ndarray, timestamps: np.ndarray):
+        """
+        測定データ保存（CSV）
+        
+        Args:
+            accel_data: shape=(N, 3) の加速度データ配列
+            timestamps: shape=(N,) のタイムスタンプ配列 [µs]
+        """
+        if len(accel_data) == 0:
             print("No data to save")
             return
         
         filename = self._create_filename("measurement")
-        with open(filename, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'ax', 'ay', 'az'])
-            for i, a in enumerate(accel_list):
-                ts = timestamps[i] if i < len(timestamps) else 0
-                writer.writerow([ts, f"{a.ax:.3f}", f"{a.ay:.3f}", f"{a.az:.3f}"])
+        data_with_ts = np.column_stack([timestamps, accel_data])
+        np.savetxt(filename, data_with_ts, delimiter=',',
+                   header='timestamp,ax,ay,az', comments='', fmt='%d,%.3f,%.3f,%.3f')
+        print(f"Saved: {filename}")
+    
+    def save_measurement_npz(self, accel_data: np.ndarray, timestamps: np.ndarray):
+        """測定データ保存（圧縮バイナリ、丸めなし）"""
+        if len(accel_data) == 0:
+            print("No data to save")
+            return
+        
+        filename = self._create_filename("measurement", ext="npz")
+        np.savez_compressed(filename, ts=timestamps, accel=accel_data)
         print(f"Saved: {filename}")
     
     def save_qd_result(self, results: List[dict]):
@@ -497,8 +687,7 @@ class MeasurementSystem:
                     data, ts = self.data_manager.stop_recording()
                     self.file_writer.save_measurement(data, ts)
                 elif cmd == 'c':
-                    for lst in self.data_manager.accel_lists:
-                        lst.clear()
+                    self.data_manager.clear_all()
                     print("Data cleared")
                 elif cmd == 'q':
                     self.shutdown()
@@ -9,19 +9,22 @@ pip install numpy pyserial pyqtgraph PyQt6
 @author keigo ushiyama (Pythonバージョン)
 """
 import sys
+import math
 import time
-import csv
-import struct
 import threading
 from pathlib import Path
 from datetime import datetime
-from collections import deque
 from typing import List, Tuple, Optional
 
 import numpy as np
 import serial
 import pyqtgraph as pg
-from pyqtgraph.Qt import QtCore, QtWidgets
+from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
+
+try:
+    from numba import njit
+except ImportError:  # numba未導入ならNumPy実装で動作
+    njit = None
 
 
 # ============================================================
@@ -48,48 +51,36 @@ class Config:
     DATA_DIR = Path("./data")
     
     FRAMERATE = 60  # PyQtGraphなら60FPS可能
+    
+    READ_BATCH_FRAMES = 32  # シリアル1回の読み取りでまとめて受け取るフレーム数
 
 
 # ============================================================
-# 加速度データクラス
+# 生データ変換
 # ============================================================
-class Accel:
-    """加速度データ"""
-    
-    def __init__(self, raw_x: int = None, raw_y: int = None, raw_z: int = None,
-                 ax: float = None, ay: float = None, az: float = None):
-        if raw_x is not None:
-            self.ax = self._convert(raw_x)
-            self.ay = self._convert(raw_y)
-            self.az = self._convert(raw_z)
-        else:
-            self.ax = ax or 0.0
-            self.ay = ay or 0.0
-            self.az = az or 0.0
-    
-    @staticmethod
-    def _convert(raw_value: int) -> float:
-        """生データをm/s²に変換"""
-        if raw_value > 32767:
-            raw_value -= 65536
-        g_value = raw_value * (2.0 * Config.FULL_SCALE) / Config.ADC_RESOLUTION
-        return g_value * Config.GRAVITY_MS2
-
-
-def calc_average_accel(accel_list: List[Accel]) -> Accel:
-    """平均加速度を計算（重力除去用）"""
-    if not accel_list:
-        return Accel(ax=0, ay=0, az=0)
-    sum_x = sum(a.ax for a in accel_list)
-    sum_y = sum(a.ay for a in accel_list)
-    sum_z = sum(a.az for a in accel_list)
-    n = len(accel_list)
-    return Accel(ax=sum_x/n, ay=sum_y/n, az=sum_z/n)
+# 生データ(int16) → m/s² 変換係数
+_ACCEL_SCALE = np.float32(
+    (2.0 * Config.FULL_SCALE) / Config.ADC_RESOLUTION * Config.GRAVITY_MS2
+)
 
 
 # ============================================================
 # 直交検波（振動検出）
 # ============================================================
+if njit is not None:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _detect(az, SS, CC, inv_2N):
+        """sin/cos内積を1ループで計算し、振幅と位相を返す"""
+        ss = 0.0
+        cc = 0.0
+        for i in range(az.shape[0]):
+            ss += SS[i] * az[i]
+            cc += CC[i] * az[i]
+        return math.sqrt(ss * ss + cc * cc) * inv_2N, math.atan2(cc, ss)
+else:
+    _detect = None
+
+
 class VibrationDetector:
     """直交検波による振動検出"""
     
@@ -102,19 +93,28 @@ class VibrationDetector:
         """sin/cos基底を初期化"""
         t = np.arange(Config.DATA_LEN) / Config.SAMPLING_RATE
         w = 2 * np.pi * Config.VIBRATION_FREQ
-        self.SS = np.sin(w * t)
-        self.CC = np.cos(w * t)
-    
-    def detect(self, accel_list: List[Accel]) -> Tuple[float, float]:
+        # 加速度データと同じ float32 の連続配列で持つ（アップキャストを避ける）
+        self.SS = np.ascontiguousarray(np.sin(w * t), dtype=np.float32)
+        self.CC = np.ascontiguousarray(np.cos(w * t), dtype=np.float32)
+        self.inv_2N = np.float32(2.0 / Config.DATA_LEN)
+        if _detect is not None:
+            # 初回呼び出しのJITコンパイル（キャッシュ読み込み）を起動時に済ませる
+            _detect(np.zeros(Config.DATA_LEN, dtype=np.float32),
+                    self.SS, self.CC, self.inv_2N)
+    
+    def detect(self, az: np.ndarray) -> Tuple[float, float]:
         """振幅と位相を検出"""
-        if len(accel_list) < Config.DATA_LEN:
+        if len(az) < Config.DATA_LEN:
             return 0.0, 0.0
         
-        az = np.array([a.az for a in accel_list[:Config.DATA_LEN]])
-        ss_sum = np.sum(self.SS * az)
-        cc_sum = np.sum(self.CC * az)
+        az = az[:Config.DATA_LEN]
+        if _detect is not None:
+            return _detect(az, self.SS, self.CC, self.inv_2N)
+        
+        ss_sum = np.dot(self.SS, az)
+        cc_sum = np.dot(self.CC, az)
         
-        amplitude = np.sqrt(ss_sum**2 + cc_sum**2) * 2.0 / Config.DATA_LEN
+        amplitude = np.sqrt(ss_sum**2 + cc_sum**2) * self.inv_2N
         phase = np.arctan2(cc_sum, ss_sum)
         
         return amplitude, phase
@@ -127,44 +127,127 @@ class DataManager:
     """データ収集と管理"""
     
     def __init__(self):
-        # MAX_SENSOR_NUM分の配列を確保
-        self.accel_lists = [deque(maxlen=Config.DATA_LEN) 
-                           for _ in range(Config.MAX_SENSOR_NUM)]
-        self.measurement_list = []
-        self.timestamps = []
+        # センサー×サンプル×軸 のリングバッファ（float32）
+        self.buf = np.zeros((Config.SENSOR_NUM, Config.DATA_LEN, 3), dtype=np.float32)
+        self.widx = np.zeros(Config.SENSOR_NUM, dtype=int)   # 次の書き込み位置
+        self.count = np.zeros(Config.SENSOR_NUM, dtype=int)  # 有効サンプル数
+        self.sum = np.zeros((Config.SENSOR_NUM, 3), dtype=np.float64)  # リング内の軸ごとの総和
+        self.version = np.zeros(Config.SENSOR_NUM, dtype=np.uint64)  # 更新ごとに増える版数
+        # 記録用バッファ（満杯になったら容量を倍にする）
+        self.measurement = np.empty((1024, 3), dtype=np.float32)
+        self.timestamps = np.empty(1024, dtype=np.int64)  # [µs]
+        self.measurement_num = 0
         self.max_amps = [0.0] * Config.MAX_SENSOR_NUM
         self.calc_amps = [0.0] * Config.MAX_SENSOR_NUM
         self.is_recording = False
         self._lock = threading.Lock()
-    
-    def add_data(self, sensor_id: int, accel: Accel):
-        """データを追加"""
-        if sensor_id >= Config.MAX_SENSOR_NUM:
-            return
+        self._sample_dt_us = 1e6 / Config.SAMPLING_RATE
+        # タイムスタンプは起動時の壁時計を基準に perf_counter の経過時間で求める
+        # （time.time は分解能が粗く、時刻同期で巻き戻ることがある）
+        self._t0_us = time.time_ns() // 1000
+        self._p0_ns = time.perf_counter_ns()
+    
+    def add_block(self, block: np.ndarray):
+        """
+        複数フレーム分のデータを一括追加（ロック取得は1回）
+        
+        Args:
+            block: shape=(フレーム数, SENSOR_NUM, 3) の加速度 [m/s²]
+        """
+        nframes = len(block)
         with self._lock:
-            self.accel_lists[sensor_id].append(accel)
             if self.is_recording:
-                self.measurement_list.append(accel)
-                self.timestamps.append(int(time.time_ns() / 1000))
-    
-    def get_data(self, sensor_id: int) -> List[Accel]:
-        """データを取得"""
+                self._record(block)
+            
+            # リングより長い分は古い側を捨てる
+            block = block[-Config.DATA_LEN:]
+            k = len(block)
+            rows = np.arange(Config.SENSOR_NUM)[:, None]
+            idx = (self.widx[:, None] + np.arange(k)) % Config.DATA_LEN  # (SENSOR_NUM, k)
+            new = block.transpose(1, 0, 2)  # (SENSOR_NUM, k, 3)
+            
+            # 総和を差分更新（有効なサンプルが入っていたスロットの分だけ引く）
+            evicted = np.arange(k) >= (Config.DATA_LEN - self.count)[:, None]
+            old = np.where(evicted[:, :, None], self.buf[rows, idx], 0.0)
+            self.sum += new.sum(axis=1, dtype=np.float64) - old.sum(axis=1)
+            
+            self.buf[rows, idx] = new
+            self.widx = (self.widx + k) % Config.DATA_LEN
+            np.minimum(self.count + nframes, Config.DATA_LEN, out=self.count)
+            self.version += 1
+    
+    def _record(self, block: np.ndarray):
+        """記録用バッファへ追記（ロック取得済みで呼ぶ）"""
+        nframes = len(block)
+        rows = block.reshape(-1, 3)
+        n = self.measurement_num
+        self._reserve(n + len(rows))
+        self.measurement[n:n + len(rows)] = rows
+        # 時刻取得はバッチごとに1回。各フレームの時刻はサンプリング周期から逆算する [µs]
+        t_last = self._t0_us + (time.perf_counter_ns() - self._p0_ns) // 1000
+        frame_ts = t_last - (np.arange(nframes - 1, -1, -1) * self._sample_dt_us).astype(np.int64)
+        self.timestamps[n:n + len(rows)] = np.repeat(frame_ts, Config.SENSOR_NUM)
+        self.measurement_num = n + len(rows)
+    
+    def _reserve(self, size: int):
+        """記録用バッファ（測定データ・タイムスタンプ）の容量を size 行以上に拡張"""
+        cap = len(self.measurement)
+        if size <= cap:
+            return
+        while cap < size:
+            cap *= 2
+        n = self.measurement_num
+        grown = np.empty((cap, 3), dtype=np.float32)
+        grown[:n] = self.measurement[:n]
+        self.measurement = grown
+        grown_ts = np.empty(cap, dtype=np.int64)
+        grown_ts[:n] = self.timestamps[:n]
+        self.timestamps = grown_ts
+    
+    def get_view(self, sensor_id: int,
+                 out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        時系列順に並べた (n, 3) 配列と、その窓の軸ごとの平均 (3,) を取得
+        
+        out (shape=(DATA_LEN, 3)) を渡すとそこへ直接コピーし、その先頭 n 行を返す。
+        ロック中は折り返し前後の2スライスのコピーだけを行う。
+        平均は同じロック内で取るので、返すデータと必ず同じ窓のもの（重力除去用）
+        """
+        if out is None:
+            out = np.empty((Config.DATA_LEN, 3), dtype=np.float32)
+        with self._lock:
+            w, c = self.widx[sensor_id], self.count[sensor_id]
+            ring = self.buf[sensor_id]
+            if c < Config.DATA_LEN:
+                np.copyto(out[:c], ring[:c])
+            else:
+                head = Config.DATA_LEN - w
+                np.copyto(out[:head], ring[w:])
+                np.copyto(out[head:], ring[:w])
+            mean = self.sum[sensor_id] / c if c else np.zeros(3)
+        return out[:c], mean
+    
+    def clear(self):
+        """表示用データをクリア"""
         with self._lock:
-            return list(self.accel_lists[sensor_id])
+            self.widx[:] = 0
+            self.count[:] = 0
+            self.sum[:] = 0.0
+            self.version += 1
     
     def start_recording(self):
         """記録開始"""
         with self._lock:
-            self.measurement_list.clear()
-            self.timestamps.clear()
+            self.measurement_num = 0
             self.is_recording = True
         print("Recording started")
     
-    def stop_recording(self) -> Tuple[List[Accel], List[int]]:
-        """記録停止"""
+    def stop_recording(self) -> Tuple[np.ndarray, np.ndarray]:
+        """記録停止（測定データ shape=(N, 3) とタイムスタンプ shape=(N,) を返す）"""
         with self._lock:
             self.is_recording = False
-            return self.measurement_list.copy(), self.timestamps.copy()
+            n = self.measurement_num
+            return self.measurement[:n].copy(), self.timestamps[:n].copy()
 
 
 # ============================================================
@@ -221,18 +304,17 @@ class SerialComm:
             pass  # Linux/macOSでは無視
         
         bytes_expected = Config.SENSOR_NUM * 6
-        # print(f"Serial reading loop started. Expecting {bytes_expected} bytes per packet")
+        batch_bytes = bytes_expected * Config.READ_BATCH_FRAMES
+        pending = b''  # タイムアウトで途中までしか届かなかったフレームの残り
         
         while self.is_running:
             try:
-                available = self.port.in_waiting
-                if available >= bytes_expected:
-                    buffer = self.port.read(bytes_expected)
-                    # print(f"Received {len(buffer)} bytes: {buffer.hex()}")  # デバッグ出力
-                    self._parse_data(buffer)
-                elif available > 0:
-                    pass
-                    # print(f"Partial data: {available} bytes available")  # デバッグ出力
+                # in_waiting をポーリングせず、READ_BATCH_FRAMES 分をまとめて待つ
+                buffer = pending + self.port.read(batch_bytes - len(pending))
+                usable = len(buffer) - len(buffer) % bytes_expected
+                pending = buffer[usable:]
+                if usable:
+                    self._parse_data(buffer[:usable])
             except Exception as e:
                 print(f"Read error: {e}")
                 import traceback
@@ -242,13 +324,11 @@ class SerialComm:
     def _parse_data(self, buffer: bytes):
         """データ解析"""
         try:
-            for sensor_id in range(Config.SENSOR_NUM):
-                offset = sensor_id * 6
-                raw = [struct.unpack('>h', buffer[offset+i*2:offset+i*2+2])[0] 
-                       for i in range(3)]
-                accel = Accel(raw_x=raw[0], raw_y=raw[1], raw_z=raw[2])
-                self.data_manager.add_data(sensor_id, accel)
-                # print(f"Sensor {sensor_id}: raw={raw}, accel={accel}")  # デバッグ出力
+            # ビッグエンディアンint16を一括変換 → (フレーム数, SENSOR_NUM, 3) [m/s²]
+            raw = np.frombuffer(buffer, dtype='>i2').reshape(-1, Config.SENSOR_NUM, 3)
+            accel = raw.astype(np.float32) * _ACCEL_SCALE
+            self.data_manager.add_block(accel)
+            # print(f"raw={raw}, accel={accel}")  # デバッグ出力
         except Exception as e:
             print(f"Parse error: {e}")
             print(f"Buffer: {buffer.hex()}")
@@ -265,6 +345,80 @@ class SerialComm:
 # ============================================================
 # 可視化（PyQtGraph - 高速）
 # ============================================================
+# QPen は毎回生成せず全プロットで共有する
+_PEN_X = pg.mkPen('r', width=1)
+_PEN_Y = pg.mkPen('g', width=1)
+_PEN_Z = pg.mkPen('b', width=1)
+_ZERO_PEN = pg.mkPen('k', width=1, style=QtCore.Qt.PenStyle.DashLine)
+
+def _configure_opengl():
+    """
+    OpenGL描画の既定設定（QApplication 生成前に呼ぶ）
+    
+    スワップ間隔を1（VSync同期）に固定し、ドライバ既定の設定によって
+    タイマー周期と無関係に余分なフレームが描かれるのを防ぐ。
+    """
+    fmt = QtGui.QSurfaceFormat()
+    fmt.setSwapInterval(1)
+    QtGui.QSurfaceFormat.setDefaultFormat(fmt)
+    QtWidgets.QApplication.setAttribute(
+        QtCore.Qt.ApplicationAttribute.AA_UseDesktopOpenGL, True)
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _detrend_maxabs(v, mean, out):
+        """
+        重力除去と |z| の最大値計算を1パスで行う
+        
+        v: (n, 3) の生データ、mean: (3,) の平均、out: (3, n) の出力先
+        """
+        mx, my, mz = mean[0], mean[1], mean[2]
+        m = 0.0
+        for i in range(v.shape[0]):
+            out[0, i] = v[i, 0] - mx
+            out[1, i] = v[i, 1] - my
+            t = v[i, 2] - mz
+            out[2, i] = t
+            a = abs(t)
+            if a > m:
+                m = a
+        return m
+else:
+    def _detrend_maxabs(v, mean, out):
+        """重力除去と |z| の最大値計算（NumPy版）"""
+        np.subtract(v.T, mean[:, None], out=out)
+        z = out[2]
+        return max(-float(z.min()), float(z.max()))
+
+
+# 直交検波の実行間隔 [s]（振幅表示は2Hzで十分）
+_DETECT_INTERVAL = 0.5
+
+
+class _DetectSignals(QtCore.QObject):
+    """検波結果をUIスレッドへ返すシグナル"""
+    detected = QtCore.Signal(int, float)  # sensor_id, amplitude
+    finished = QtCore.Signal()
+
+
+class _DetectTask(QtCore.QRunnable):
+    """直交検波をワーカースレッドで実行（numba版はGILを解放して並列に動く）"""
+    
+    def __init__(self, detector: VibrationDetector, signals: _DetectSignals,
+                 batch: List[Tuple[int, np.ndarray]]):
+        super().__init__()
+        self.detector = detector
+        self.signals = signals
+        self.batch = batch
+    
+    def run(self):
+        for sid, az in self.batch:
+            amplitude, _ = self.detector.detect(az)
+            self.signals.detected.emit(sid, float(amplitude))
+        self.signals.finished.emit()
+
+
 class Visualizer(QtWidgets.QWidget):
     """PyQtGraphによる高速リアルタイム可視化"""
     
@@ -275,9 +429,16 @@ class Visualizer(QtWidgets.QWidget):
         
         # FPS計測
         self.frame_count = 0
-        self.last_time = time.time()
+        self.last_time = time.perf_counter()
         self.fps = 0.0
         
+        # 直交検波はスレッドプールで実行し、結果はシグナルで受け取る
+        self._detect_signals = _DetectSignals()
+        self._detect_signals.detected.connect(self._on_detected)
+        self._detect_signals.finished.connect(self._on_detect_finished)
+        self._detect_busy = False
+        self._last_detect = 0.0
+        
         self._init_ui()
     
     def _init_ui(self):
@@ -322,7 +483,7 @@ class Visualizer(QtWidgets.QWidget):
         # または他の色: '#E8E8E8'（薄いグレー）, '#F5F5F5'（ほぼ白）など
         layout.addWidget(self.graphics_layout)
         
-        # 8個のプロット（2行4列）
+        # 8枠（2行4列）。プロットはアクティブなセンサー分だけ作る
         self.plots = []
         self.curves = []
         self.text_items = []
@@ -333,81 +494,100 @@ class Visualizer(QtWidgets.QWidget):
             row = i // 4  # 0, 1
             col = i % 4   # 0, 1, 2, 3
             
+            # 非アクティブな枠は静的なラベルだけ置く（ViewBox・カーブを作らない）
+            if i >= Config.SENSOR_NUM:
+                placeholder = self.graphics_layout.addLayout(row=row, col=col)
+                placeholder.addLabel(f'Sensor {i + 1}<br>Not Active',
+                                     color='#AAAAAA', size='12pt')
+                # プロットと同じサイズヒントを与えて、グリッドを均等に分ける
+                if self.plots:
+                    ref = self.plots[0]
+                    placeholder.setMinimumSize(
+                        ref.effectiveSizeHint(QtCore.Qt.SizeHint.MinimumSize))
+                    placeholder.setPreferredSize(
+                        ref.effectiveSizeHint(QtCore.Qt.SizeHint.PreferredSize))
+                continue
+            
             # プロット作成
             plot = self.graphics_layout.addPlot(row=row, col=col)
             
-            # アクティブかどうかで表示を変える
-            is_active = i < Config.SENSOR_NUM
-            title_color = '#000000' if is_active else '#888888'  # 黒 or グレー
-            label_color = '#000000' if is_active else '#888888'
-            
-            plot.setTitle(f'Sensor {i + 1}', color=title_color, size='12pt')
-            plot.setLabel('left', 'Accel', units='m/s²', color=label_color)
+            plot.setTitle(f'Sensor {i + 1}', color='#000000', size='12pt')
+            plot.setLabel('left', 'Accel', units='m/s²', color='#000000')
             plot.setYRange(-y_range, y_range)
+            # 表示範囲は固定なので、setData ごとの自動レンジ計算を止める
+            plot.setXRange(0, Config.DATA_LEN)
+            plot.disableAutoRange()
             plot.showGrid(x=True, y=True, alpha=0.3)
             
             # 軸の色を設定
-            axis_color = '#000000' if is_active else '#CCCCCC'
+            axis_color = '#000000'
             plot.getAxis('left').setPen(axis_color)
             plot.getAxis('bottom').setPen(axis_color)
             plot.getAxis('left').setTextPen(axis_color)
             plot.getAxis('bottom').setTextPen(axis_color)
             
-            # 非アクティブなセンサーは背景を暗くする
-            if not is_active:
-                plot.getViewBox().setBackgroundColor('#F0F0F0')
-            
-            # 凡例（アクティブセンサーのみ）
-            if is_active:
-                legend = plot.addLegend(offset=(5, 5))
-                # 凡例のスタイル設定
-                legend.setParentItem(plot.getViewBox())
-                legend.anchor((0, 0), (0, 0))  # 左上に固定
+            # 凡例
+            legend = plot.addLegend(offset=(5, 5))
+            # 凡例のスタイル設定
+            legend.setParentItem(plot.getViewBox())
+            legend.anchor((0, 0), (0, 0))  # 左上に固定
             
             # X, Y, Z軸のカーブ
-            # 高速化: downsample と clipToView を有効化
-            curve_x = plot.plot(pen=pg.mkPen('r', width=1), name='X' if is_active else None)
-            curve_y = plot.plot(pen=pg.mkPen('g', width=1), name='Y' if is_active else None)
-            curve_z = plot.plot(pen=pg.mkPen('b', width=1), name='Z' if is_active else None)
-            
-            # データアイテムの高速化設定
-            for curve in [curve_x, curve_y, curve_z]:
-                curve.setClipToView(True)  # 表示範囲外のデータを描画しない
-                curve.setDownsampling(auto=True, method='peak')  # 自動ダウンサンプリング
+            # DATA_LEN 点は常に全体が表示範囲内かつ画素数未満なので、
+            # clipToView / ダウンサンプリングは有効にしない
+            curve_x = plot.plot(pen=_PEN_X, name='X')
+            curve_y = plot.plot(pen=_PEN_Y, name='Y')
+            curve_z = plot.plot(pen=_PEN_Z, name='Z')
             
             # ゼロライン
-            plot.plot([0, Config.DATA_LEN], [0, 0], 
-                     pen=pg.mkPen('k', width=1, style=QtCore.Qt.PenStyle.DashLine))
+            plot.plot([0, Config.DATA_LEN], [0, 0], pen=_ZERO_PEN)
             
             # 振幅表示テキスト（右上に配置）
-            text_color = '#000000' if is_active else '#AAAAAA'
-            text = pg.TextItem('', anchor=(1, 0), color=text_color)  # anchor=(1,0)で右上基準
-            # ViewBoxの右上に配置（座標は後で更新時に設定）
+            text = pg.TextItem('', anchor=(1, 0), color='#000000')  # anchor=(1,0)で右上基準
             plot.addItem(text)
-            
-            # 非アクティブなセンサーには "Not Active" と表示
-            if not is_active:
-                text.setText('Not Active')
-                text.setColor('#AAAAAA')
-                # 中央に配置
-                text.setPos(Config.DATA_LEN / 2, 0)
-                text.setAnchor((0.5, 0.5))
+            # ViewBoxの右上に配置（データ座標系、軸範囲は固定なので一度だけ）
+            text.setPos(Config.DATA_LEN - 10, y_range * 0.95)
             
             self.plots.append(plot)
             self.curves.append({'x': curve_x, 'y': curve_y, 'z': curve_z})
             self.text_items.append(text)
         
+        # 描画用バッファ（毎フレームの配列確保を避ける）
+        # setData は配列の参照を保持するので、センサーごとに2面を交互に使う
+        self._xidx = np.arange(Config.DATA_LEN, dtype=np.int32)
+        self._raw = np.empty((Config.DATA_LEN, 3), dtype=np.float32)  # get_view の受け皿（全センサー共用）
+        self._bufs = [[np.empty((3, Config.DATA_LEN), dtype=np.float32) for _ in range(2)]
+                      for _ in range(Config.SENSOR_NUM)]
+        self._frame = 0
+        self._last_ver = np.zeros(Config.SENSOR_NUM, dtype=np.uint64)
+        self._last_text = [''] * Config.SENSOR_NUM
+        if njit is not None:
+            # 初回呼び出しのJITコンパイルを起動時に済ませる
+            # （リングが満杯のときと途中のときで出力スライスのレイアウトが変わるので両方）
+            v = np.zeros((Config.DATA_LEN, 3), dtype=np.float32)
+            o = np.zeros((3, Config.DATA_LEN), dtype=np.float32)
+            for n in (Config.DATA_LEN, Config.DATA_LEN - 1):
+                _detrend_maxabs(v[:n], np.zeros(3), o[:, :n])
+        
         # タイマー設定（高速更新）
         self.timer = QtCore.QTimer()
+        # 既定の CoarseTimer は周期の±5%（Windowsでは約15.6ms単位）で丸められるため、
+        # ミリ秒精度の PreciseTimer で一定間隔に発火させる
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
         self.timer.timeout.connect(self.update_plots)
         # 高速化: 30FPSに制限（60FPSは過剰）
         self.timer.start(33)  # 約30FPS (1000/30 ≈ 33ms)
+        
+        # 振幅テキストは描画とは独立に2Hzで更新
+        self.text_timer = QtCore.QTimer()
+        self.text_timer.timeout.connect(self.update_texts)
+        self.text_timer.start(500)
     
     def update_plots(self):
         """プロット更新（最適化版）"""
         # FPS計算
         self.frame_count += 1
-        current_time = time.time()
+        current_time = time.perf_counter()
         elapsed = current_time - self.last_time
         
         if elapsed >= 1.0:
@@ -416,53 +596,68 @@ class Visualizer(QtWidgets.QWidget):
             self.frame_count = 0
             self.last_time = current_time
         
+        self._frame += 1
+        detect_due = (not self._detect_busy
+                      and current_time - self._last_detect >= _DETECT_INTERVAL)
+        detect_batch = []
+        
         # アクティブなセンサーのみ更新
         for sid in range(Config.SENSOR_NUM):
-            data = self.data_manager.get_data(sid)
-            if not data:
+            # 新しいサンプルが来ていなければ再描画しない
+            ver = self.data_manager.version[sid]
+            if ver == self._last_ver[sid]:
                 continue
+            self._last_ver[sid] = ver
             
+            # データとその平均は同じスナップショットから取る
+            data, mean = self.data_manager.get_view(sid, out=self._raw)
             n = len(data)
             if n == 0:
                 continue
             
-            # 重力除去（NumPy配列で高速化）
-            ax_arr = np.array([a.ax for a in data])
-            ay_arr = np.array([a.ay for a in data])
-            az_arr = np.array([a.az for a in data])
-            
-            avg_x = np.mean(ax_arr)
-            avg_y = np.mean(ay_arr)
-            avg_z = np.mean(az_arr)
-            
-            x_data = ax_arr - avg_x
-            y_data = ay_arr - avg_y
-            z_data = az_arr - avg_z
-            
-            x_idx = np.arange(n)
-            
-            # カーブ更新（高速化: connect='finite'で不連続なデータを無視）
-            self.curves[sid]['x'].setData(x_idx, x_data, connect='finite')
-            self.curves[sid]['y'].setData(x_idx, y_data, connect='finite')
-            self.curves[sid]['z'].setData(x_idx, z_data, connect='finite')
-            
-            # 振幅計算
-            max_amp = np.max(np.abs(z_data)) if len(z_data) > 0 else 0
+            # 重力除去と最大振幅（確保済みバッファへ直接書き込む）
+            out = self._bufs[sid][self._frame & 1][:, :n]
+            max_amp = _detrend_maxabs(data, mean, out)
             self.data_manager.max_amps[sid] = max_amp
+            x_data, y_data, z_data = out
             
-            if len(data) >= Config.DATA_LEN:
-                calc_amp, _ = self.detector.detect(data)
-                self.data_manager.calc_amps[sid] = calc_amp
-            else:
-                calc_amp = 0
+            x_idx = self._xidx[:n]
             
-            # テキスト更新（1秒に1回程度に制限）
-            if elapsed >= 0.5:  # 0.5秒ごとに更新
-                text_str = f"Calc: {calc_amp:.3f} m/s²\nMeas: {max_amp:.3f} m/s²"
+            # カーブ更新（データは常に有限値なので NaN/inf チェックを省略）
+            self.curves[sid]['x'].setData(x_idx, x_data, skipFiniteCheck=True)
+            self.curves[sid]['y'].setData(x_idx, y_data, skipFiniteCheck=True)
+            self.curves[sid]['z'].setData(x_idx, z_data, skipFiniteCheck=True)
+            
+            if n < Config.DATA_LEN:
+                self.data_manager.calc_amps[sid] = 0.0
+            elif detect_due:
+                # self._raw は次のセンサーで上書きされるのでコピーして渡す
+                detect_batch.append((sid, data[:, 2].copy()))
+        
+        if detect_batch:
+            self._detect_busy = True
+            self._last_detect = current_time
+            QtCore.QThreadPool.globalInstance().start(
+                _DetectTask(self.detector, self._detect_signals, detect_batch))
+    
+    def _on_detected(self, sid: int, amplitude: float):
+        """検波結果の受け取り（UIスレッド）"""
+        self.data_manager.calc_amps[sid] = amplitude
+    
+    def _on_detect_finished(self):
+        """検波タスク完了（次の投入を許可）"""
+        self._detect_busy = False
+    
+    def update_texts(self):
+        """振幅テキスト更新（text_timer から2Hzで呼ばれる）"""
+        for sid in range(Config.SENSOR_NUM):
+            calc_amp = self.data_manager.calc_amps[sid]
+            max_amp = self.data_manager.max_amps[sid]
+            text_str = f"Calc: {calc_amp:.3f} m/s²\nMeas: {max_amp:.3f} m/s²"
+            # 表示内容が変わったときだけ setText する
+            if text_str != self._last_text[sid]:
                 self.text_items[sid].setText(text_str)
-                # 右上の座標を設定（データ座標系）
-                y_range = Config.FULL_SCALE * Config.GRAVITY_MS2
-                self.text_items[sid].setPos(Config.DATA_LEN - 10, y_range * 0.95)
+                self._last_text[sid] = text_str
 
 
 # ============================================================
@@ -480,19 +675,17 @@ class FileWriter:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         return Config.DATA_DIR / self.base_name / f"{self.base_name}-{suffix}-{timestamp}.csv"
     
-    def save_measurement(self, accel_list: List[Accel], timestamps: List[int]):
-        """測定データ保存"""
-        if not accel_list:
+    def save_measurement(self, accel: np.ndarray, timestamps: np.ndarray):
+        """測定データ保存（accel: shape=(N, 3)）"""
+        if len(accel) == 0:
             print("No data to save")
             return
         
         filename = self._create_filename("measurement")
-        with open(filename, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'ax', 'ay', 'az'])
-            for i, a in enumerate(accel_list):
-                ts = timestamps[i] if i < len(timestamps) else 0
-                writer.writerow([ts, f"{a.ax:.3f}", f"{a.ay:.3f}", f"{a.az:.3f}"])
+        # 書式化は np.savetxt に任せて1回で書き出す
+        data_with_ts = np.column_stack([timestamps, accel])
+        np.savetxt(filename, data_with_ts, delimiter=',',
+                   header='timestamp,ax,ay,az', comments='', fmt='%d,%.3f,%.3f,%.3f')
         print(f"Saved: {filename}")
 
 
@@ -515,6 +708,7 @@ class MeasurementSystem:
         self.file_writer = FileWriter(file_name)
         
         # Qt アプリケーション
+        _configure_opengl()
         self.app = QtWidgets.QApplication(sys.argv)
         self.visualizer = Visualizer(self.data_manager, self.detector)
         
@@ -564,8 +758,7 @@ class MeasurementSystem:
                     data, ts = self.data_manager.stop_recording()
                     self.file_writer.save_measurement(data, ts)
                 elif cmd == 'c':
-                    for lst in self.data_manager.accel_lists:
-                        lst.clear()
+                    self.data_manager.clear()
                     print("Data cleared")
                 elif cmd == 'q':
                     self.shutdown()
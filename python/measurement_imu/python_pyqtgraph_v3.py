@@ -10,19 +10,21 @@ pip install numpy pyserial pyqtgraph PyQt6
 """
 import sys
 import time
-import csv
-import struct
 import threading
 from pathlib import Path
 from datetime import datetime
-from collections import deque
-from typing import List, Tuple, Optional
+from typing import Tuple
 
 import numpy as np
 import serial
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
 
+try:
+    from numba import njit
+except ImportError:  # numba未導入ならNumPy実装で動作
+    njit = None
+
 
 # ============================================================
 # 設定
@@ -31,6 +33,8 @@ class Config:
     """システム設定"""
     COM_PORT = "COM7"
     BAUD_RATE = 460800
+    READ_TIMEOUT = 0.05  # [s] 受信待ちの上限（停止要求への応答時間もこれで決まる）
+    READ_BATCH_PACKETS = 4  # シリアル1回の読み取りで受け取る最大パケット数
     
     FULL_SCALE = 16.0  # [g]
     SAMPLING_RATE = 1660.0  # [Hz]
@@ -51,198 +55,198 @@ class Config:
 
 
 # ============================================================
-# 加速度データクラス（NumPy対応版）
+# 加速度変換（NumPy対応版）
 # ============================================================
-class Accel:
-    """加速度データ（シンプル版）"""
-    __slots__ = ['ax', 'ay', 'az']  # メモリ最適化
-    
-    def __init__(self, raw_x: int = None, raw_y: int = None, raw_z: int = None,
-                 ax: float = None, ay: float = None, az: float = None):
-        if raw_x is not None:
-            self.ax = self._convert(raw_x)
-            self.ay = self._convert(raw_y)
-            self.az = self._convert(raw_z)
-        else:
-            self.ax = ax or 0.0
-            self.ay = ay or 0.0
-            self.az = az or 0.0
-    
-    @staticmethod
-    def _convert(raw_value: int) -> float:
-        """生データをm/s²に変換"""
-        # if raw_value > 32767:
-        #     raw_value -= 65536
-        g_value = raw_value * (2.0 * Config.FULL_SCALE) / Config.ADC_RESOLUTION
-        return g_value * Config.GRAVITY_MS2
+# 生データ(符号付き16bit) → m/s² の変換係数（G単位への変換と重力加速度を1つにまとめる）
+_ACCEL_SCALE = np.float32((2.0 * Config.FULL_SCALE / Config.ADC_RESOLUTION) * Config.GRAVITY_MS2)
+_RAW_DTYPE = np.dtype('>i2')  # パケット内の加速度は big-endian int16
 
 
-def convert_raw_to_ms2(raw_values: np.ndarray) -> np.ndarray:
-    """
-    生データ配列をm/s²に一括変換（NumPy版）
-    
-    Args:
-        raw_values: shape=(N, 3) の生データ配列
-    Returns:
-        shape=(N, 3) のm/s²配列
-    """
-    # 符号付き16bit整数で送られてくる
-    signed_values = raw_values.copy()
-    # signed_values[signed_values > 32767] -= 65536
-    
-    # G単位に変換
-    g_values = signed_values * (2.0 * Config.FULL_SCALE) / Config.ADC_RESOLUTION
-    
-    # m/s²に変換
-    ms2_values = g_values * Config.GRAVITY_MS2
-    
-    return ms2_values
+if njit is not None:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _decode_accel(buf, out, scale):
+        """
+        パケットのデータ部（big-endian int16 の並び）を m/s² に変換する
+        
+        buf: データ部のバイト列（memoryview 可）、out: (len(buf)//2,) の float32 出力先
+        1パケット分の小さな配列では NumPy の呼び出しコストが支配的なので、ループで直接書き込む
+        """
+        for i in range(out.shape[0]):
+            v = (buf[2 * i] << 8) | buf[2 * i + 1]
+            if v >= 32768:
+                v -= 65536
+            out[i] = v * scale
+else:
+    def _decode_accel(buf, out, scale):
+        """パケットのデータ部を m/s² に変換（NumPy版）"""
+        np.multiply(np.frombuffer(buf, dtype=_RAW_DTYPE), scale, out=out, dtype=np.float32)
 
 
 # ============================================================
 # 直交検波（振動検出）
 # ============================================================
 class VibrationDetector:
-    """直交検波による振動検出"""
+    """直交検波による振動検出（sin/cos基底を保持。検波本体は _process で全センサーまとめて行う）"""
     
     def __init__(self):
-        self.SS = np.zeros(Config.DATA_LEN)
-        self.CC = np.zeros(Config.DATA_LEN)
+        self.SS = np.zeros(Config.DATA_LEN, dtype=np.float32)
+        self.CC = np.zeros(Config.DATA_LEN, dtype=np.float32)
         self._init_bases()
     
     def _init_bases(self):
-        """sin/cos基底を初期化"""
+        """sin/cos基底を初期化（加速度データに合わせて float32）"""
         t = np.arange(Config.DATA_LEN) / Config.SAMPLING_RATE
         w = 2 * np.pi * Config.VIBRATION_FREQ
-        self.SS = np.sin(w * t)
-        self.CC = np.cos(w * t)
-    
-    def detect(self, az) -> Tuple[float, float]:
-        """振幅と位相を検出"""
-        if len(az) < Config.DATA_LEN:
-            return 0.0, 0.0
-        
-        # az = np.array([az for az in accel_list[:Config.DATA_LEN]])
-        ss_sum = np.sum(self.SS * az)
-        cc_sum = np.sum(self.CC * az)
-        
-        amplitude = np.sqrt(ss_sum**2 + cc_sum**2) * 2.0 / Config.DATA_LEN
-        phase = np.arctan2(cc_sum, ss_sum)
-        
-        return amplitude, phase
+        # 全センサー分を1回の行列積で検波できるよう (2, DATA_LEN) にまとめ、SS/CC はその行のビュー
+        self.SC = np.stack([np.sin(w * t), np.cos(w * t)]).astype(np.float32)
+        self.SS, self.CC = self.SC
 
 
 # ============================================================
 # データ収集・管理（NumPy版）
 # ============================================================
+_REC_INIT_CAP = 65536  # 記録用バッファの初期容量 [パケット]
+# リングの長さは DATA_LEN 以上の2のべき乗にして、剰余の代わりにマスクで折り返す
+# （DATA_LEN は振動の整数周期分なので2のべき乗にはできない。余りは表示しない）
+_RING_LEN = 1 << (Config.DATA_LEN - 1).bit_length()
+_RING_MASK = _RING_LEN - 1
+
+
 class DataManager:
     """データ収集と管理（NumPy配列使用）"""
     
     def __init__(self):
-        # NumPy配列でデータ管理（shape: [MAX_SENSOR_NUM, DATA_LEN, 3]）
-        self.accel_data = np.zeros((Config.MAX_SENSOR_NUM, Config.DATA_LEN, 3), dtype=np.float32)
-        self.data_index = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.int32)  # 各センサーの書き込み位置
-        self.data_count = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.int32)  # 各センサーのデータ数
-        
-        self.measurement_list = []
-        self.timestamps = []
+        # NumPy配列でデータ管理（shape: [3, MAX_SENSOR_NUM, 2*_RING_LEN]）
+        # 軸ごとに分けて持つので、1軸分の時系列がメモリ上で連続する
+        # 同じサンプルを idx と idx+_RING_LEN の2か所に書くことで、
+        # 最新 count 個が常に accel_data[:, :, idx+_RING_LEN-count:idx+_RING_LEN] に連続して並ぶ
+        self.accel_data = np.zeros((3, Config.MAX_SENSOR_NUM, 2 * _RING_LEN), dtype=np.float32)
+        # 全センサーが同じパケットで同時に進むので、書き込み位置とデータ数は1組で持つ
+        self._ring_idx = 0  # 次の書き込み位置
+        self._count = 0  # 有効データ数（最大DATA_LEN）
+        
+        # 記録用バッファ（パケット単位、満杯になったら容量を倍にする）
+        self._rec_buf = np.empty((_REC_INIT_CAP, Config.SENSOR_NUM, 3), dtype=np.float32)
+        self._rec_ts = np.empty(_REC_INIT_CAP, dtype=np.int64)  # パケットごとのタイムスタンプ [µs]
+        self._rec_n = 0
         self.max_amps = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.float32)
         self.min_amps = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.float32)
         self.calc_amps = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.float32)
         self.is_recording = False
-        self._lock = threading.Lock()
-    
-    def add_data(self, sensor_id: int, ax: float, ay: float, az: float):
+        # 描画側はロックを取らず、シーケンス番号で整合性を確認する（seqlock）
+        # 奇数: 書き込み中、偶数: 書き込み完了
+        self._write_seq = 0
+        # リングへの書き込み（受信スレッドの add_packet とコマンドスレッドの clear_all）同士の排他
+        # 読み出し側は取らないので、ほぼ競合しない
+        self._ring_lock = threading.Lock()
+        self._lock = threading.Lock()  # 記録用バッファの保護
+    
+    def add_packet(self, arr: np.ndarray):
         """
-        データを追加（NumPy版）
+        1パケット分の全センサーデータを追加
         
         Args:
-            sensor_id: センサーID
-            ax, ay, az: 加速度 [m/s²]
+            arr: shape=(SENSOR_NUM, 3) の加速度 [m/s²]
         """
-        if sensor_id >= Config.MAX_SENSOR_NUM:
-            return
+        # リングバッファとして使用（前後でシーケンス番号を進める）
+        with self._ring_lock:
+            self._write_seq += 1
+            idx = self._ring_idx
+            arr_t = arr.T  # (3, SENSOR_NUM)
+            self.accel_data[:, :Config.SENSOR_NUM, idx] = arr_t
+            self.accel_data[:, :Config.SENSOR_NUM, idx + _RING_LEN] = arr_t
+            self._ring_idx = (idx + 1) & _RING_MASK
+            self._count = min(self._count + 1, Config.DATA_LEN)
+            self._write_seq += 1
+        
+        # 記録中なら追加
+        if self.is_recording:
+            with self._lock:
+                if self._rec_n == len(self._rec_buf):
+                    self._grow_recording()
+                self._rec_buf[self._rec_n] = arr
+                self._rec_ts[self._rec_n] = time.time_ns() // 1000  # 整数演算のまま µs に
+                self._rec_n += 1
+    
+    def _grow_recording(self):
+        """記録用バッファの容量を倍にする（ロック取得済みで呼ぶ）"""
+        n = self._rec_n
+        buf = np.empty((2 * len(self._rec_buf),) + self._rec_buf.shape[1:], dtype=np.float32)
+        buf[:n] = self._rec_buf[:n]
+        ts = np.empty(len(buf), dtype=np.int64)
+        ts[:n] = self._rec_ts[:n]
+        self._rec_buf, self._rec_ts = buf, ts
+    
+    def read_begin(self) -> int:
+        """
+        読み出し開始時のシーケンス番号を取得（書き込み中なら完了を待つ）
         
-        with self._lock:
-            idx = self.data_index[sensor_id]
-            
-            # リングバッファとして使用
-            self.accel_data[sensor_id, idx, 0] = ax
-            self.accel_data[sensor_id, idx, 1] = ay
-            self.accel_data[sensor_id, idx, 2] = az
-            
-            # インデックス更新
-            self.data_index[sensor_id] = (idx + 1) % Config.DATA_LEN
-            
-            # データ数更新（最大DATA_LEN）
-            if self.data_count[sensor_id] < Config.DATA_LEN:
-                self.data_count[sensor_id] += 1
-            
-            # 記録中なら追加
-            if self.is_recording and sensor_id < Config.SENSOR_NUM:
-                self.measurement_list.append([ax, ay, az])
-                self.timestamps.append(int(time.time_ns() / 1000))
+        Returns:
+            read_retry に渡すシーケンス番号
+        """
+        while True:
+            seq = self._write_seq
+            if not seq & 1:
+                return seq
+            time.sleep(0)  # 受信スレッドに GIL を譲る
+    
+    def read_retry(self, seq: int) -> bool:
+        """read_begin 以降に書き込みがあれば True（読んだデータを捨ててやり直す）"""
+        return self._write_seq != seq
     
-    def get_data_numpy(self, sensor_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def get_window(self) -> np.ndarray:
         """
-        データを取得（NumPy版）
+        アクティブな全センサーのデータをまとめて取得
         
         Returns:
-            (x_data, y_data, z_data) のタプル
+            shape=(3, SENSOR_NUM, count) のビュー（軸, センサー, 時刻の古い順）
+            accel_data のビューを返すのでコピーは発生しない。
+            読み出し専用として扱い、read_begin / read_retry で挟んで整合性を確認すること
         """
-        with self._lock:
-            count = self.data_count[sensor_id]
-            if count == 0:
-                return np.array([]), np.array([]), np.array([])
-            
-            idx = self.data_index[sensor_id]
-            
-            # リングバッファから正しい順序でデータを取得
-            if count < Config.DATA_LEN:
-                # まだバッファが満たされていない
-                x_data = self.accel_data[sensor_id, :count, 0].copy()
-                y_data = self.accel_data[sensor_id, :count, 1].copy()
-                z_data = self.accel_data[sensor_id, :count, 2].copy()
-            else:
-                # バッファが満杯：古いデータから順に並べ替え
-                x_data = np.concatenate([
-                    self.accel_data[sensor_id, idx:, 0],
-                    self.accel_data[sensor_id, :idx, 0]
-                ])
-                y_data = np.concatenate([
-                    self.accel_data[sensor_id, idx:, 1],
-                    self.accel_data[sensor_id, :idx, 1]
-                ])
-                z_data = np.concatenate([
-                    self.accel_data[sensor_id, idx:, 2],
-                    self.accel_data[sensor_id, :idx, 2]
-                ])
-            
-            return x_data, y_data, z_data
+        while True:
+            seq = self.read_begin()
+            count = self._count
+            # 二重化しているので、書き込み位置の直前 count 個が古い順に連続
+            # （満杯前でも同じ式で先頭からのデータになる）
+            end = self._ring_idx + _RING_LEN
+            if not self.read_retry(seq):
+                break
+        return self.accel_data[:, :Config.SENSOR_NUM, end - count:end]
     
     def start_recording(self):
         """記録開始"""
         with self._lock:
-            self.measurement_list.clear()
-            self.timestamps.clear()
+            self._rec_n = 0
             self.is_recording = True
         print("Recording started")
     
-    def stop_recording(self) -> Tuple[np.ndarray, List[int]]:
-        """記録停止"""
+    def stop_recording(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        記録停止
+        
+        Returns:
+            shape=(N, 3) の加速度データと shape=(N,) のタイムスタンプ
+            （N = パケット数 × SENSOR_NUM、センサー順に並ぶ）
+        """
         with self._lock:
             self.is_recording = False
-            data = np.array(self.measurement_list) if self.measurement_list else np.array([])
-            return data, self.timestamps.copy()
+            n = self._rec_n
+            data = self._rec_buf[:n].reshape(-1, 3).copy()
+            # 1パケット内の各センサーは同時刻のサンプルなので、パケットの時刻をそのまま並べる
+            timestamps = np.repeat(self._rec_ts[:n], Config.SENSOR_NUM)
+            return data, timestamps
     
     def clear_all(self):
         """全データクリア"""
-        with self._lock:
+        # add_packet と同じく書き込みロック内でシーケンス番号を進め、読み出し側にやり直させる
+        with self._ring_lock:
+            self._write_seq += 1
+            self._count = 0
+            self._ring_idx = 0
             self.accel_data.fill(0)
-            self.data_index.fill(0)
-            self.data_count.fill(0)
-            self.measurement_list.clear()
-            self.timestamps.clear()
+            self._write_seq += 1
+        with self._lock:
+            self._rec_n = 0
 
 
 # ============================================================
@@ -258,9 +262,14 @@ class SerialComm:
         self.thread = None
         
         self.last_seq = None  # 直前の seq を保持してギャップ検出に使う
+        self._accel_buf = np.empty((Config.SENSOR_NUM, 3), dtype=np.float32)  # 変換結果の受け皿
+        self._accel_flat = self._accel_buf.reshape(-1)  # 同じメモリの1次元ビュー
+        if njit is not None:
+            # 初回呼び出しのJITコンパイルを起動時に済ませる（実行時と同じく bytearray の memoryview で）
+            _decode_accel(memoryview(bytearray(Config.SENSOR_NUM * 6)), self._accel_flat, _ACCEL_SCALE)
 
         try:
-            self.port = serial.Serial(Config.COM_PORT, Config.BAUD_RATE, timeout=1)
+            self.port = serial.Serial(Config.COM_PORT, Config.BAUD_RATE, timeout=Config.READ_TIMEOUT)
             print(f"Serial opened: {Config.COM_PORT}")
             time.sleep(2)
         except Exception as e:
@@ -268,7 +277,9 @@ class SerialComm:
     
     @staticmethod
     def calc_checksum(data: bytes) -> int:
-        """Arduino 側と同じ: バイトの和を 16bit にマスク"""
+        """Arduino 側と同じ: バイトの和を 16bit にマスク（bytes / bytearray / memoryview）"""
+        # 1パケット（数十バイト）なら組み込みの sum が最速。
+        # np.frombuffer(...).sum() は呼び出しのオーバーヘッドで数倍遅くなる
         return sum(data) & 0xFFFF
 
 
@@ -327,74 +338,82 @@ class SerialComm:
             f"+ CHECKSUM(2) + FOOTER(0xFE)"
         )
 
-        buffer = bytearray()
+        payload_end = header_len + seq_len + data_len  # checksum計算に含める長さ
+        data_start = header_len + seq_len
+
+        batch_bytes = bytes_expected * Config.READ_BATCH_PACKETS
+        rx = bytearray()  # 受信済み・未処理のバイト列（ループ中ずっと使い回す）
         consecutive_errors = 0
         max_consecutive_errors = 50  # 必要なら調整
 
         while self.is_running:
             try:
-                # 1バイトずつ読んで HEADER を探す
-                b = self.port.read(1)
-                if not b:
-                    # タイムアウト。状況によっては sleep を少し入れてもよい
-                    continue
-
-                if b[0] != 0x7F:
-                    # ヘッダじゃないので捨てて次へ
+                # 届いている分をまとめて読む（最大 READ_BATCH_PACKETS 分、何もなければ 1バイト待つ）
+                # Windows では1回の read が ReadFile 1回になるので、バイト単位より呼び出し回数が大幅に減る
+                chunk = self.port.read(max(min(batch_bytes, self.port.in_waiting), 1))
+                if not chunk:
+                    # タイムアウト（READ_TIMEOUT）。is_running を見直す
                     continue
-
-                # ヘッダは見つかったので、残りをまとめて読む
-                rest = self.port.read(bytes_expected - 1)
-                if len(rest) != bytes_expected - 1:
-                    print(f"Incomplete packet: got {len(rest)+1} bytes, expected {bytes_expected}")
-                    consecutive_errors += 1
-                    if consecutive_errors > max_consecutive_errors:
-                        print("Too many errors, resetting input buffer...")
-                        try:
-                            self.port.reset_input_buffer()
-                        except Exception as e:
-                            print(f"reset_input_buffer error: {e}")
+                rx += chunk
+
+                i = 0  # 未処理部分の先頭
+                with memoryview(rx) as mv:
+                    while True:
+                        # HEADER を探す（手前のゴミはまとめて読み飛ばす）
+                        i = rx.find(0x7F, i)
+                        if i < 0:
+                            i = len(rx)
+                            break
+                        if len(rx) - i < bytes_expected:
+                            break  # 1パケット分そろうまで次の read を待つ
+
+                        # FOOTER チェック（ずれていれば 1バイト進めて再同期）
+                        footer = rx[i + bytes_expected - 1]
+                        if footer != 0xFE:
+                            print(f"Invalid footer: 0x{footer:02X}, expected 0xFE")
+                            consecutive_errors += 1
+                            i += 1
+                            continue
+
+                        # seq 抜き出し（big-endian）
+                        seq = (rx[i + 1] << 8) | rx[i + 2]
+                        if self.last_seq is not None:
+                            diff = (seq - self.last_seq) & 0xFFFF
+                            if diff != 1:
+                                print(f"Sequence jump detected: prev={self.last_seq}, now={seq}, diff={diff}")
+                        self.last_seq = seq
+
+                        # チェックサム確認
+                        checksum_start = i + payload_end
+                        calc = SerialComm.calc_checksum(mv[i:checksum_start])
+                        recv = (rx[checksum_start] << 8) | rx[checksum_start + 1]
+
+                        if calc != recv:
+                            print(f"Checksum mismatch: calc=0x{calc:04X}, recv=0x{recv:04X}")
+                            consecutive_errors += 1
+                            i += 1
+                            continue  # このパケットは捨てる
+
+                        # ここまで来ればパケットは正常
                         consecutive_errors = 0
-                    continue
 
-                packet = b + rest  # 長さ bytes_expected の 1パケット
+                        # データ部だけをコピーせずに解析へ渡す
+                        d = i + data_start
+                        self._parse_data(mv[d:d + data_len])  # length = SENSOR_NUM * 6
+                        i += bytes_expected
 
-                # FOOTER チェック
-                if packet[-1] != 0xFE:
-                    print(f"Invalid footer: 0x{packet[-1]:02X}, expected 0xFE")
-                    consecutive_errors += 1
-                    continue
+                # 処理済みの先頭部分を削除（mv を解放してから）
+                if i:
+                    del rx[:i]
 
-                # seq 抜き出し（big-endian）
-                seq = (packet[1] << 8) | packet[2]
-                if self.last_seq is not None:
-                    diff = (seq - self.last_seq) & 0xFFFF
-                    if diff != 1:
-                        print(f"Sequence jump detected: prev={self.last_seq}, now={seq}, diff={diff}")
-                self.last_seq = seq
-
-                # チェックサム確認
-                payload_end = header_len + seq_len + data_len  # checksum計算に含める長さ
-                checksum_start = payload_end
-                checksum_end = checksum_start + checksum_len
-
-                calc = SerialComm.calc_checksum(packet[:payload_end])
-                recv = (packet[checksum_start] << 8) | packet[checksum_start + 1]
-
-                if calc != recv:
-                    print(f"Checksum mismatch: calc=0x{calc:04X}, recv=0x{recv:04X}")
-                    consecutive_errors += 1
-                    continue  # このパケットは捨てる
-
-                # ここまで来ればパケットは正常
-                consecutive_errors = 0
-
-                # データ部だけを取り出して解析へ渡す
-                data_start = header_len + seq_len
-                data_end = data_start + data_len
-                data_buffer = packet[data_start:data_end]  # length = SENSOR_NUM * 6
-
-                self._parse_data(data_buffer)
+                if consecutive_errors > max_consecutive_errors:
+                    print("Too many errors, resetting input buffer...")
+                    try:
+                        self.port.reset_input_buffer()
+                    except Exception as e:
+                        print(f"reset_input_buffer error: {e}")
+                    rx.clear()
+                    consecutive_errors = 0
 
             except Exception as e:
                 print(f"Read error: {e}")
@@ -403,18 +422,12 @@ class SerialComm:
                 break
 
     
-    def _parse_data(self, buffer: bytes):
+    def _parse_data(self, buffer: memoryview):
         """データ解析（NumPy版）"""
         try:
-            raw_data = np.frombuffer(buffer, dtype='>i2').reshape(Config.SENSOR_NUM, 3)
-            accel_data = convert_raw_to_ms2(raw_data)
-            for sensor_id in range(Config.SENSOR_NUM):
-                self.data_manager.add_data(
-                    sensor_id,
-                    accel_data[sensor_id, 0],
-                    accel_data[sensor_id, 1],
-                    accel_data[sensor_id, 2],
-                )
+            # 1次元のまま変換して確保済みバッファへ書き込む（reshape のビュー生成を省く）
+            _decode_accel(buffer, self._accel_flat, _ACCEL_SCALE)
+            self.data_manager.add_packet(self._accel_buf)
         except Exception as e:
             print(f"Parse error: {e}")
             print(f"Buffer length: {len(buffer)}, expected: {Config.SENSOR_NUM * 6}")
@@ -432,6 +445,163 @@ class SerialComm:
 # ============================================================
 # 可視化（PyQtGraph - 高速）
 # ============================================================
+if njit is not None:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _process(win, SC, out, max_amps, min_amps, calc_amps):
+        """
+        全センサーの重力除去・z の最大/最小・直交検波をまとめて計算する
+        
+        win: (3, S, n) の生データ、SC: (2, DATA_LEN) の sin/cos 基底、out: (3, S, n) の出力先
+        max_amps, min_amps, calc_amps: (S,) の出力先
+        （calc_amps は n == DATA_LEN のときのみ有効、それ以外は0）
+        """
+        SS = SC[0]
+        CC = SC[1]
+        n = win.shape[2]
+        full = n == SS.shape[0]
+        for s in range(win.shape[1]):
+            x = win[0, s]
+            y = win[1, s]
+            z = win[2, s]
+            mx = 0.0
+            my = 0.0
+            mz = 0.0
+            for i in range(n):
+                mx += x[i]
+                my += y[i]
+                mz += z[i]
+            mx /= n
+            my /= n
+            mz /= n
+            
+            zmax = z[0] - mz
+            zmin = zmax
+            ss_sum = 0.0
+            cc_sum = 0.0
+            for i in range(n):
+                out[0, s, i] = x[i] - mx
+                out[1, s, i] = y[i] - my
+                t = z[i] - mz
+                out[2, s, i] = t
+                if t > zmax:
+                    zmax = t
+                if t < zmin:
+                    zmin = t
+                if full:
+                    ss_sum += SS[i] * t
+                    cc_sum += CC[i] * t
+            
+            max_amps[s] = zmax
+            min_amps[s] = zmin
+            calc_amps[s] = np.sqrt(ss_sum * ss_sum + cc_sum * cc_sum) * 2.0 / n if full else 0.0
+else:
+    def _process(win, SC, out, max_amps, min_amps, calc_amps):
+        """全センサーの重力除去・z の最大/最小・直交検波（NumPy版）"""
+        # センサー方向にまとめて平均を引く（ループなし）
+        np.subtract(win, win.mean(axis=2, keepdims=True), out=out)
+        zc = out[2]
+        np.max(zc, axis=1, out=max_amps)
+        np.min(zc, axis=1, out=min_amps)
+        if zc.shape[1] != SC.shape[1]:
+            calc_amps[:] = 0.0
+            return
+        # 全センサーの sin/cos 積和を行列積1回で求める
+        sc = zc @ SC.T  # (S, 2)
+        np.hypot(sc[:, 0], sc[:, 1], out=calc_amps)
+        calc_amps *= 2.0 / SC.shape[1]
+
+
+class PlotPrepWorker(QtCore.QThread):
+    """描画用データの前処理（重力除去・振幅計算）を行うワーカースレッド"""
+    # [(sid, x_idx, x_data, y_data, z_data, max_amp, min_amp, calc_amp), ...]
+    prepared = QtCore.Signal(object)
+    
+    def __init__(self, data_manager: DataManager, detector: VibrationDetector, interval_ms: int = 33):
+        super().__init__()
+        self.data_manager = data_manager
+        self.detector = detector
+        self.interval = interval_ms / 1000.0
+        self._running = False
+        # UIスレッドが前のフレームを受け取るまで次のフレームを作らない
+        self._busy = False
+        
+        # 描画用バッファ（毎フレームの配列確保を避ける）
+        # setData は配列の参照を保持するので、2面を交互に使う
+        self._x_idx = np.arange(Config.DATA_LEN, dtype=np.int32)
+        self._bufs = [np.empty((3, Config.SENSOR_NUM, Config.DATA_LEN), dtype=np.float32) for _ in range(2)]
+        self._frame = 0
+        self._last_seq = -1  # 前回描画したときの DataManager のシーケンス番号
+        if njit is not None:
+            # 初回呼び出しのJITコンパイルを起動時に済ませる
+            # （実行時と同じく、リングのビューと出力バッファのスライスで呼ぶ）
+            ring = np.zeros((3, Config.MAX_SENSOR_NUM, 2 * _RING_LEN), dtype=np.float32)  # accel_data と同じ形状
+            amps = np.zeros(Config.MAX_SENSOR_NUM, dtype=np.float32)[:Config.SENSOR_NUM]
+            for n in (Config.DATA_LEN, Config.DATA_LEN - 1):
+                _process(ring[:, :Config.SENSOR_NUM, :n], self.detector.SC,
+                         self._bufs[0][:, :, :n], amps, amps, amps)
+    
+    def run(self):
+        """一定間隔で prepare を呼ぶ（numba版はGILを解放するのでUIスレッドと並列に動く）"""
+        self._running = True
+        next_time = time.perf_counter()
+        while self._running:
+            self.prepare()
+            next_time += self.interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()  # 遅れたら追いつこうとせず間隔を取り直す
+    
+    def stop(self):
+        """ワーカー停止（終了まで待つ）"""
+        self._running = False
+        self.wait()
+    
+    def frame_done(self):
+        """UIスレッドが prepared の結果を描画し終えたら呼ぶ"""
+        self._busy = False
+    
+    def prepare(self):
+        """1フレーム分の描画データを作って prepared を発行"""
+        if self._busy:
+            return
+        
+        # 新しいパケットが来ていなければ再描画しない
+        frame_seq = self.data_manager.read_begin()
+        if frame_seq == self._last_seq:
+            return
+        self._last_seq = frame_seq
+        self._frame += 1
+        
+        # アクティブな全センサーをまとめて処理
+        # 計算中に受信スレッドが書き込んだら読み直す
+        S = Config.SENSOR_NUM
+        dm = self.data_manager
+        while True:
+            seq = dm.read_begin()
+            win = dm.get_window()  # (3, SENSOR_NUM, n) のビュー
+            n = win.shape[2]
+            if n == 0:
+                return
+            
+            # 重力除去・最大/最小・直交検波を1関数で（確保済みバッファと振幅配列へ直接書き込む）
+            out = self._bufs[self._frame & 1][:, :, :n]
+            _process(win, self.detector.SC, out,
+                     dm.max_amps[:S], dm.min_amps[:S], dm.calc_amps[:S])
+            if not dm.read_retry(seq):
+                break
+        
+        x_idx = self._x_idx[:n]
+        results = [(sid, x_idx, out[0, sid], out[1, sid], out[2, sid],
+                    float(dm.max_amps[sid]), float(dm.min_amps[sid]), float(dm.calc_amps[sid]))
+                   for sid in range(S)]
+        
+        if results:
+            self._busy = True
+            self.prepared.emit(results)
+
+
 class Visualizer(QtWidgets.QWidget):
     """PyQtGraphによる高速リアルタイム可視化"""
     
@@ -564,75 +734,60 @@ class Visualizer(QtWidgets.QWidget):
             self.curves.append({'x': curve_x, 'y': curve_y, 'z': curve_z})
             self.text_items.append(text)
         
-        # タイマー設定（高速更新）
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_plots)
+        self._last_text_time = 0.0
+        
+        # 前処理はワーカースレッドで行い、ここでは結果を描画するだけにする
         # 高速化: 30FPSに制限（60FPSは過剰）
-        self.timer.start(33)  # 約30FPS (1000/30 ≈ 33ms)
-    
-    def update_plots(self):
-        """プロット更新（NumPy最適化版）"""
-        # FPS計算
-        self.frame_count += 1
-        current_time = time.time()
-        elapsed = current_time - self.last_time
-        
-        if elapsed >= 1.0:
-            self.fps = self.frame_count / elapsed
-            self.fps_label.setText(f'FPS: {self.fps:.1f}')
-            self.frame_count = 0
-            self.last_time = current_time
-        
-        # アクティブなセンサーのみ更新
-        for sid in range(Config.SENSOR_NUM):
-            # NumPy配列で直接取得
-            x_data, y_data, z_data = self.data_manager.get_data_numpy(sid)
-            
-            if len(x_data) == 0:
-                continue
-            
-            # 重力除去（NumPy高速演算）
-            x_data = x_data - np.mean(x_data)
-            y_data = y_data - np.mean(y_data)
-            z_data = z_data - np.mean(z_data)
-            
-            n = len(x_data)
-            x_idx = np.arange(n)
+        self.worker = PlotPrepWorker(self.data_manager, self.detector, interval_ms=33)
+        self.worker.prepared.connect(self.update_plots)
+        self.worker.start()
+    
+    def update_plots(self, results: list):
+        """プロット更新（PlotPrepWorker の前処理結果を受け取る）"""
+        try:
+            # FPS計算
+            self.frame_count += 1
+            current_time = time.time()
+            elapsed = current_time - self.last_time
             
-            # カーブ更新（高速化）
-            self.curves[sid]['x'].setData(x_idx, x_data, connect='finite')
-            self.curves[sid]['y'].setData(x_idx, y_data, connect='finite')
-            self.curves[sid]['z'].setData(x_idx, z_data, connect='finite')
+            if elapsed >= 1.0:
+                self.fps = self.frame_count / elapsed
+                self.fps_label.setText(f'FPS: {self.fps:.1f}')
+                self.frame_count = 0
+                self.last_time = current_time
             
-            # 振幅計算（NumPy）
-            # 最大値の記録
-            max_amp = np.max(z_data) if len(z_data) > 0 else 0
-            self.data_manager.max_amps[sid] = max_amp
-            # 最小値の記録
-            min_amp = np.min(z_data) if len(z_data) > 0 else 0
-            self.data_manager.min_amps[sid] = min_amp
-
-            diff_amp = (max_amp - min_amp) / 2.0
+            # テキスト更新（0.5秒に1回程度に制限）
+            update_text = current_time - self._last_text_time >= 0.5
+            if update_text:
+                self._last_text_time = current_time
             
-            # 直交検波（データが十分にある場合）
-            if len(z_data) >= Config.DATA_LEN:
-                calc_amp, _ = self.detector.detect(z_data)
-                self.data_manager.calc_amps[sid] = calc_amp
-            else:
-                calc_amp = 0
+            for sid, x_idx, x_data, y_data, z_data, max_amp, min_amp, calc_amp in results:
+                # カーブ更新（高速化）
+                self.curves[sid]['x'].setData(x_idx, x_data, connect='finite')
+                self.curves[sid]['y'].setData(x_idx, y_data, connect='finite')
+                self.curves[sid]['z'].setData(x_idx, z_data, connect='finite')
             
-            # テキスト更新（0.5秒に1回程度に制限）
-            # if elapsed >= 0.5:
-            text_str = f"Calc: {calc_amp:.3f} m/s²\n(Max-Min)/2: {diff_amp:.3f} m/s²"
-            self.text_items[sid].setText(text_str)
-            # 右上の座標を設定（データ座標系）
-            y_range = Config.FULL_SCALE * Config.GRAVITY_MS2
-            self.text_items[sid].setPos(Config.DATA_LEN - 10, y_range * 0.95)
+                if not update_text:
+                    continue
+                diff_amp = (max_amp - min_amp) / 2.0
+                text_str = f"Calc: {calc_amp:.3f} m/s²\n(Max-Min)/2: {diff_amp:.3f} m/s²"
+                self.text_items[sid].setText(text_str)
+                # 右上の座標を設定（データ座標系）
+                y_range = Config.FULL_SCALE * Config.GRAVITY_MS2
+                self.text_items[sid].setPos(Config.DATA_LEN - 10, y_range * 0.95)
+        finally:
+            # 描画用バッファを受け取ったので次のフレームを作ってよい
+            # （途中で例外が出ても解除しないと、ワーカーが止まったままになる）
+            self.worker.frame_done()
 
 
 # ============================================================
 # ファイル保存
 # ============================================================
+_CSV_ROW_FMT = '%d,%.3f,%.3f,%.3f\n'
+_CSV_CHUNK_ROWS = 65536  # 1回の書式化でまとめる行数
+
+
 class FileWriter:
     """ファイル保存"""
     
@@ -645,13 +800,13 @@ class FileWriter:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         return Config.DATA_DIR / self.base_name / f"{self.base_name}-{suffix}-{timestamp}.csv"
     
-    def save_measurement(self, accel_data: np.ndarray, timestamps: List[int]):
+    def save_measurement(self, accel_data: np.ndarray, timestamps: np.ndarray):
         """
         測定データ保存（NumPy版）
         
         Args:
             accel_data: shape=(N, 3) の加速度データ配列
-            timestamps: タイムスタンプリスト
+            timestamps: shape=(N,) のタイムスタンプ配列 [µs]
         """
         if len(accel_data) == 0:
             print("No data to save")
@@ -659,15 +814,16 @@ class FileWriter:
         
         filename = self._create_filename("measurement")
         
-        # NumPyでCSV保存（高速）
-        header = 'timestamp,ax,ay,az'
-        data_with_ts = np.column_stack([
-            timestamps[:len(accel_data)],
-            accel_data
-        ])
-        
-        np.savetxt(filename, data_with_ts, delimiter=',', 
-                   header=header, comments='', fmt='%d,%.3f,%.3f,%.3f')
+        # 1行ずつ書式化する np.savetxt の代わりに、まとまった行数を
+        # 1つの書式文字列で一括変換して書き込む（出力内容は同じ）
+        timestamps = timestamps[:len(accel_data)]
+        n = len(accel_data)
+        with open(filename, 'w') as f:
+            f.write('timestamp,ax,ay,az\n')
+            for start in range(0, n, _CSV_CHUNK_ROWS):
+                end = min(start + _CSV_CHUNK_ROWS, n)
+                rows = zip(timestamps[start:end].tolist(), *accel_data[start:end].T.tolist())
+                f.write((_CSV_ROW_FMT * (end - start)) % tuple(v for row in rows for v in row))
         
         print(f"Saved: {filename}")
 
@@ -693,6 +849,7 @@ class MeasurementSystem:
         # Qt アプリケーション
         self.app = QtWidgets.QApplication(sys.argv)
         self.visualizer = Visualizer(self.data_manager, self.detector)
+        self.app.aboutToQuit.connect(self.visualizer.worker.stop)
         
         print("=== Initialization Complete ===\n")
         self._print_help()